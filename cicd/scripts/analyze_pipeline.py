@@ -7,10 +7,213 @@ CI/CDパイプライン設定ファイルを分析し、最適化提案を出力
     python analyze_pipeline.py .gitlab-ci.yml
 """
 
+import hashlib
+import io
+import os
+import pickle
+import stat
 import sys
+import time
 import yaml
 from pathlib import Path
 
+# LibYAML が利用可能ならCローダーで高速にパースする
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:
+    from yaml import SafeLoader as _Loader
+
+
+# 読み込み結果のキャッシュ。スキーマを変えたら _CACHE_VERSION を上げる
+_CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "analyze_pipeline"
+_CACHE_VERSION = 2
+_CACHE_MAX_AGE = 30 * 24 * 60 * 60  # 更新されないエントリを削除するまでの秒数
+
+# GitLab CI でジョブ以外を表すトップレベルキー
+_GITLAB_RESERVED_KEYS = frozenset(
+    {"stages", "variables", "default", "include", "workflow", "cache"}
+)
+
+# 分析で参照するキーだけを残すためのスキーマ
+# _KEEP はサブツリー全体を保持、dict はキーごと（"*" は任意のキー）、
+# list は各要素に適用するスキーマ。スキーマにないキーは存在だけを残す。
+_KEEP = object()
+
+_GITHUB_JOB_SCHEMA = {
+    "steps": [{"uses": _KEEP, "with": _KEEP}],
+    "needs": _KEEP,
+    "timeout-minutes": _KEEP,
+}
+
+_GITLAB_JOB_SCHEMA = {
+    "only": _KEEP,
+    "except": _KEEP,
+    "artifacts": _KEEP,
+    "needs": _KEEP,
+    "stage": _KEEP,
+}
+
+_CONFIG_SCHEMA = {
+    "jobs": {"*": _GITHUB_JOB_SCHEMA},
+    "on": _KEEP,
+    True: _KEEP,  # クォートなしの on は YAML 1.1 で True として解決される
+    "*": _GITLAB_JOB_SCHEMA,
+}
+
+
+# マージキー（<<）と値キー（=）はマッピング全体の構築時にしか解決できない
+_SPECIAL_KEY_TAGS = frozenset({"tag:yaml.org,2002:merge", "tag:yaml.org,2002:value"})
+
+
+class _Unsupported(Exception):
+    """イベント走査では扱えない構文（アンカー・エイリアス・明示タグ等）"""
+
+
+def _skip_node(events) -> None:
+    """コレクションの残りのイベントを読み捨てる
+
+    読み捨てる部分でも、扱えない構文があれば通常の読み込みにフォールバックする。
+    """
+    depth = 1
+    while depth:
+        event = next(events)
+        if isinstance(event, yaml.AliasEvent) or (
+            isinstance(event, yaml.NodeEvent)
+            and (event.anchor is not None or event.tag is not None)
+        ):
+            raise _Unsupported
+        if isinstance(event, yaml.CollectionStartEvent):
+            depth += 1
+        elif isinstance(event, yaml.CollectionEndEvent):
+            depth -= 1
+
+
+def _compose_pruned(event, events, schema, resolver, constructor):
+    """スキーマに従い、必要な部分だけのノードツリーを組み立てる"""
+    if isinstance(event, yaml.AliasEvent) or event.anchor is not None or event.tag is not None:
+        raise _Unsupported
+    
+    if isinstance(event, yaml.ScalarEvent):
+        tag = resolver.resolve(yaml.ScalarNode, event.value, event.implicit)
+        return yaml.ScalarNode(tag, event.value, style=event.style)
+    
+    if isinstance(event, yaml.SequenceStartEvent):
+        tag = resolver.resolve(yaml.SequenceNode, None, event.implicit)
+        if schema is not _KEEP and not isinstance(schema, list):
+            _skip_node(events)
+            return yaml.SequenceNode(tag, [])
+        item_schema = schema if schema is _KEEP else schema[0]
+        items = []
+        for item in events:
+            if isinstance(item, yaml.SequenceEndEvent):
+                break
+            items.append(_compose_pruned(item, events, item_schema, resolver, constructor))
+        return yaml.SequenceNode(tag, items)
+    
+    tag = resolver.resolve(yaml.MappingNode, None, event.implicit)
+    if schema is not _KEEP and not isinstance(schema, dict):
+        _skip_node(events)
+        return yaml.MappingNode(tag, [])
+    pairs = []
+    for key_event in events:
+        if isinstance(key_event, yaml.MappingEndEvent):
+            break
+        key_node = _compose_pruned(key_event, events, _KEEP, resolver, constructor)
+        if not isinstance(key_node, yaml.ScalarNode) or key_node.tag in _SPECIAL_KEY_TAGS:
+            raise _Unsupported
+        if schema is _KEEP:
+            value_schema = _KEEP
+        else:
+            key = constructor.construct_object(key_node)
+            value_schema = schema.get(key, schema.get("*"))
+        value_node = _compose_pruned(next(events), events, value_schema, resolver, constructor)
+        pairs.append((key_node, value_node))
+    return yaml.MappingNode(tag, pairs)
+
+
+def _load_config(filepath: Path):
+    """分析に必要な部分だけを構築して設定を読み込む
+
+    パースイベントを走査し、分析で参照しないサブツリーは Python オブジェクトを
+    生成せずに読み捨てる。アンカーやエイリアスなど走査で扱えない構文を含む場合は
+    通常の読み込みにフォールバックする。
+    """
+    # フォールバック時に再度開かずに済むよう、一度だけ読み込む
+    with open(filepath, "rb") as f:
+        stream = io.BytesIO(f.read())
+    # エラーメッセージにファイルパスを表示させる
+    stream.name = str(filepath)
+    
+    resolver = yaml.resolver.Resolver()
+    constructor = yaml.constructor.SafeConstructor()
+    try:
+        events = iter(yaml.parse(stream, Loader=_Loader))
+        root = None
+        for event in events:
+            if isinstance(event, yaml.DocumentStartEvent):
+                if root is not None:
+                    raise _Unsupported
+                root = _compose_pruned(
+                    next(events), events, _CONFIG_SCHEMA, resolver, constructor
+                )
+        return constructor.construct_document(root) if root is not None else None
+    except _Unsupported:
+        stream.seek(0)
+        return yaml.load(stream, Loader=_Loader)
+
+
+def _prune_cache(keep: Path) -> None:
+    """一定期間更新されていないキャッシュエントリを削除する"""
+    cutoff = time.time() - _CACHE_MAX_AGE
+    for entry in _CACHE_DIR.iterdir():
+        try:
+            if entry != keep and entry.stat().st_mtime < cutoff:
+                entry.unlink()
+        except OSError:
+            pass
+
+
+def _load_config_cached(filepath: Path):
+    """読み込み結果をファイルごとにディスクへキャッシュする
+
+    エントリはパスごとに1つで、更新時刻とサイズが一致する場合だけ再利用する。
+    """
+    st = filepath.stat()
+    if not stat.S_ISREG(st.st_mode):
+        # パイプなどは内容が毎回変わるためキャッシュしない
+        return _load_config(filepath)
+    
+    key = hashlib.blake2b(
+        f"{_CACHE_VERSION}\0{filepath.resolve()}".encode(), digest_size=16
+    ).hexdigest()
+    cache_file = _CACHE_DIR / f"{key}.pkl"
+    stamp = (st.st_mtime_ns, st.st_size)
+    
+    try:
+        with open(cache_file, "rb") as f:
+            cached_stamp, config = pickle.load(f)
+        if cached_stamp == stamp:
+            return config
+    except Exception:
+        # キャッシュがない・壊れている場合は読み込み直す
+        pass
+    
+    config = _load_config(filepath)
+    
+    tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        _CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(tmp_file, "wb") as f:
+            pickle.dump((stamp, config), f, protocol=5)
+        os.replace(tmp_file, cache_file)
+        _prune_cache(cache_file)
+    except (OSError, pickle.PickleError):
+        try:
+            tmp_file.unlink()
+        except OSError:
+            pass
+    return config
+
 
 def analyze_github_actions(config: dict) -> list[str]:
     """GitHub Actionsワークフローを分析"""
@@ -21,23 +224,28 @@ def analyze_github_actions(config: dict) -> list[str]:
     for job_name, job_config in jobs.items():
         steps = job_config.get("steps", [])
         
-        # キャッシュ使用チェック
-        has_cache = any(
-            step.get("uses", "").startswith("actions/cache") or
-            "cache" in str(step.get("with", {}))
-            for step in steps
-        )
-        if not has_cache and len(steps) > 3:
-            suggestions.append(f"[{job_name}] キャッシュの使用を検討してください")
-        
-        # checkout後のfetch-depth
+        # キャッシュ使用チェックと checkout の fetch-depth チェックを1回の走査で行う
+        has_cache = False
+        checkout_suggestions = []
         for step in steps:
-            if step.get("uses", "").startswith("actions/checkout"):
-                with_config = step.get("with", {})
-                if "fetch-depth" not in with_config:
-                    suggestions.append(
-                        f"[{job_name}] checkout に fetch-depth: 0 または 1 を設定すると高速化できます"
+            uses = step.get("uses", "")
+            with_config = step.get("with") or {}
+            if not has_cache:
+                if isinstance(with_config, dict):
+                    has_cache = uses.startswith("actions/cache") or any(
+                        "cache" in str(k) or "cache" in str(v)
+                        for k, v in with_config.items()
                     )
+                else:
+                    has_cache = uses.startswith("actions/cache") or "cache" in str(with_config)
+            if uses.startswith("actions/checkout") and "fetch-depth" not in with_config:
+                checkout_suggestions.append(
+                    f"[{job_name}] checkout に fetch-depth: 0 または 1 を設定すると高速化できます"
+                )
+        
+        if not has_cache and len(steps) > 3:
+            suggestions.append(f"[{job_name}] キャッシュの使用を検討してください")
+        suggestions.extend(checkout_suggestions)
         
         # 並列化可能性
         needs = job_config.get("needs", [])
@@ -76,13 +284,11 @@ def analyze_gitlab_ci(config: dict) -> list[str]:
         suggestions.append("[global] stages を明示的に定義すると可読性が向上します")
     
     # 各ジョブ分析
-    reserved_keys = {"stages", "variables", "default", "include", "workflow", "cache"}
-    for key, value in config.items():
-        if key in reserved_keys or not isinstance(value, dict):
-            continue
-        
-        job_config = value
-        
+    jobs = {
+        k: v for k, v in config.items()
+        if k not in _GITLAB_RESERVED_KEYS and isinstance(v, dict)
+    }
+    for key, job_config in jobs.items():
         # rules vs only/except
         if "only" in job_config or "except" in job_config:
             suggestions.append(
@@ -115,30 +321,32 @@ def main():
         print(f"エラー: ファイルが見つかりません: {filepath}")
         sys.exit(1)
     
-    with open(filepath) as f:
-        config = yaml.safe_load(f)
+    config = _load_config_cached(filepath)
     
     # ファイルタイプ判定
+    lines = []
     if "jobs" in config:
         suggestions = analyze_github_actions(config)
-        print(f"=== GitHub Actions 分析結果: {filepath} ===\n")
+        lines.append(f"=== GitHub Actions 分析結果: {filepath} ===\n")
     elif "stages" in config or any(
         isinstance(v, dict) and "script" in v for v in config.values()
     ):
         suggestions = analyze_gitlab_ci(config)
-        print(f"=== GitLab CI 分析結果: {filepath} ===\n")
+        lines.append(f"=== GitLab CI 分析結果: {filepath} ===\n")
     else:
-        print("警告: ファイルタイプを判定できませんでした")
+        lines.append("警告: ファイルタイプを判定できませんでした")
         suggestions = []
     
     if suggestions:
-        print("最適化提案:")
-        for i, suggestion in enumerate(suggestions, 1):
-            print(f"  {i}. {suggestion}")
+        lines.append("最適化提案:")
+        lines.extend(
+            f"  {i}. {suggestion}" for i, suggestion in enumerate(suggestions, 1)
+        )
     else:
-        print("問題は見つかりませんでした。")
+        lines.append("問題は見つかりませんでした。")
     
-    print(f"\n分析完了: {len(suggestions)} 件の提案")
+    lines.append(f"\n分析完了: {len(suggestions)} 件の提案")
+    sys.stdout.write("\n".join(lines) + "\n")
 
 
 if __name__ == "__main__":
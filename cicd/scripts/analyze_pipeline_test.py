@@ -0,0 +1,65 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import yaml
+
+from analyze_pipeline import _load_config, analyze_github_actions, analyze_gitlab_ci
+
+
+# Currently this is not run automatically in CI; it's just for documentation and manual checking.
+class TestLoadConfig(unittest.TestCase):
+    
+    def load(self, text):
+        """Helper to load YAML text through _load_config and yaml.safe_load"""
+        with tempfile.NamedTemporaryFile("w", suffix=".yml", delete=False) as f:
+            f.write(text)
+        try:
+            return _load_config(Path(f.name)), yaml.safe_load(text)
+        finally:
+            os.unlink(f.name)
+    
+    def test_inline_merge_key(self):
+        """Test inline << merge key falls back to a full load"""
+        config, expected = self.load("test:\n  <<: {stage: test}\n  script: [echo]\n")
+        self.assertEqual(config, expected)
+        self.assertEqual(analyze_gitlab_ci(config), analyze_gitlab_ci(expected))
+    
+    def test_value_key(self):
+        """Test = value key falls back to a full load"""
+        config, expected = self.load("test:\n  =: x\n  script: [echo]\n")
+        self.assertEqual(config, expected)
+    
+    def test_anchor_merge_key(self):
+        """Test anchored templates merged with <<: *anchor"""
+        config, expected = self.load(
+            ".tpl: &tpl\n  stage: test\n  only: [main]\njob:\n  <<: *tpl\n  script: x\n"
+        )
+        self.assertEqual(analyze_gitlab_ci(config), analyze_gitlab_ci(expected))
+    
+    def test_tag_in_skipped_subtree(self):
+        """Test explicit tags inside skipped subtrees are rejected like safe_load"""
+        text = "job:\n  before_script: [!reference [.setup, script]]\n  script: [echo]\n"
+        with tempfile.NamedTemporaryFile("w", suffix=".yml", delete=False) as f:
+            f.write(text)
+        try:
+            with self.assertRaises(yaml.constructor.ConstructorError):
+                _load_config(Path(f.name))
+        finally:
+            os.unlink(f.name)
+    
+    def test_github_actions_pruned(self):
+        """Test pruned GitHub Actions config gives the same suggestions"""
+        config, expected = self.load(
+            "on:\n  push:\n    branches: [main]\n"
+            "jobs:\n  build:\n    runs-on: ubuntu-latest\n    steps:\n"
+            "      - uses: actions/checkout@v4\n"
+            "      - uses: actions/setup-python@v5\n        with: {path: ~/.cache/pip}\n"
+            "      - run: a\n      - run: b\n"
+        )
+        self.assertEqual(analyze_github_actions(config), analyze_github_actions(expected))
+    
+
+if __name__ == '__main__':
+    unittest.main()
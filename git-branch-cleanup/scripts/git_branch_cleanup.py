@@ -4,12 +4,12 @@ Git Branch Cleanup Script (Python版)
 ローカルGitブランチを分析し、安全にクリーンアップします
 """
 
+import os
 import subprocess
 import sys
-import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Tuple, Optional
-from dataclasses import dataclass
+from typing import List, Dict, NamedTuple, Tuple, Optional
 from enum import Enum
 
 
@@ -18,12 +18,10 @@ class BranchCategory(Enum):
     MERGED = "merged"
     GONE_REMOTE = "gone_remote"
     AHEAD = "ahead"
-    STALE = "stale"
     UNMERGED = "unmerged"
 
 
-@dataclass
-class BranchInfo:
+class BranchInfo(NamedTuple):
     """ブランチ情報"""
     name: str
     category: BranchCategory
@@ -33,6 +31,7 @@ class BranchInfo:
     upstream: Optional[str] = None
     trackshort: Optional[str] = None
     is_protected: bool = False
+    is_stale: bool = False
 
 
 class GitBranchCleanup:
@@ -41,22 +40,63 @@ class GitBranchCleanup:
     # 保護ブランチ
     PROTECTED_BRANCHES = {'main', 'master', 'trunk', 'develop', 'development'}
     
-    def __init__(self, stale_days: int = 30, dry_run: bool = False):
+    # for-each-ref で一括取得するブランチ情報（NUL区切り）
+    BRANCH_INFO_FIELDS = (
+        '%(refname:short)',
+        '%(committerdate:iso8601)',
+        '%(committerdate:relative)',
+        '%(subject)',
+        '%(upstream:short)',
+        '%(upstream:trackshort)',
+        '%(upstream:track)',
+    )
+    
+    def __init__(self, stale_days: int = 30, dry_run: bool = False, aggressive_gc: bool = False):
         self.stale_days = stale_days
         self.dry_run = dry_run
+        self.aggressive_gc = aggressive_gc
+        self._stale_cutoff = (datetime.now() - timedelta(days=stale_days)).date()
         self.base_branch = self._detect_base_branch()
         self.current_branch = self._get_current_branch()
         
     def _run_git_command(self, cmd: List[str]) -> Tuple[str, int]:
         """Gitコマンドを実行"""
         try:
-            result = subprocess.run(
-                ['git'] + cmd,
-                capture_output=True,
-                text=True,
-                check=False
-            )
-            return result.stdout.strip(), result.returncode
+            # posix_spawnp は 3.8、waitstatus_to_exitcode は 3.9 以降
+            if not hasattr(os, 'posix_spawnp') or not hasattr(os, 'waitstatus_to_exitcode'):
+                result = subprocess.run(
+                    ['git'] + cmd,
+                    capture_output=True,
+                    text=True,
+                    check=False
+                )
+                return result.stdout.strip(), result.returncode
+            
+            # subprocess を経由せず直接起動し、標準出力をパイプから読む
+            read_fd, write_fd = os.pipe()
+            try:
+                pid = os.posix_spawnp('git', ['git'] + cmd, os.environ, file_actions=[
+                    (os.POSIX_SPAWN_DUP2, write_fd, 1),
+                    (os.POSIX_SPAWN_OPEN, 2, os.devnull, os.O_WRONLY, 0),
+                ])
+            except BaseException:
+                os.close(read_fd)
+                raise
+            finally:
+                os.close(write_fd)
+            try:
+                chunks = []
+                while True:
+                    chunk = os.read(read_fd, 65536)
+                    if not chunk:
+                        break
+                    chunks.append(chunk)
+            finally:
+                # 読み取りが中断されても子プロセスを必ず回収する
+                os.close(read_fd)
+                _, status = os.waitpid(pid, 0)
+            output = b''.join(chunks).decode('utf-8', 'replace')
+            return output.strip(), os.waitstatus_to_exitcode(status)
         except Exception as e:
             print(f"エラー: Gitコマンド実行失敗: {e}", file=sys.stderr)
             return "", 1
@@ -75,64 +115,22 @@ class GitBranchCleanup:
         output, code = self._run_git_command(['branch', '--show-current'])
         return output if code == 0 else ''
     
-    def _is_protected_branch(self, branch: str) -> bool:
-        """保護ブランチかチェック"""
-        return branch in self.PROTECTED_BRANCHES or branch == self.current_branch or not branch
-    
     def _update_remote_info(self):
         """リモート情報を更新"""
         print("リモート情報を更新中...")
-        _, code = self._run_git_command(['fetch', '--prune'])
+        # ブランチ名とコミット日時しか使わないため、タグは取得しない
+        _, code = self._run_git_command(['fetch', '--prune', '--no-tags', '--quiet'])
         if code != 0:
             print("警告: リモートに到達できませんでした。キャッシュされたデータを使用します。\n")
     
-    def _get_branch_info(self, branch: str) -> Dict[str, str]:
-        """ブランチの詳細情報を取得"""
-        info = {}
-        
-        # コミット日時
-        date_output, _ = self._run_git_command([
-            'log', '-1', '--format=%ci|%cr', branch
-        ])
-        if date_output:
-            parts = date_output.split('|')
-            info['commit_date'] = parts[0] if len(parts) > 0 else ''
-            info['relative_date'] = parts[1] if len(parts) > 1 else ''
-        else:
-            info['commit_date'] = ''
-            info['relative_date'] = '不明'
-        
-        # コミットメッセージ
-        subject_output, _ = self._run_git_command([
-            'log', '-1', '--format=%s', branch
-        ])
-        info['subject'] = subject_output or ''
-        
-        # 上流情報
-        upstream_output, _ = self._run_git_command([
-            'for-each-ref', f'refs/heads/{branch}',
-            '--format=%(upstream:short)|%(upstream:trackshort)'
-        ])
-        if upstream_output:
-            parts = upstream_output.split('|')
-            info['upstream'] = parts[0] if len(parts) > 0 else None
-            info['trackshort'] = parts[1] if len(parts) > 1 else None
-        else:
-            info['upstream'] = None
-            info['trackshort'] = None
-        
-        return info
-    
-    def _is_stale(self, commit_date: str) -> bool:
-        """ブランチが古いかチェック"""
-        if not commit_date:
-            return False
-        try:
-            commit_dt = datetime.strptime(commit_date.split()[0], '%Y-%m-%d')
-            cutoff_dt = datetime.now() - timedelta(days=self.stale_days)
-            return commit_dt < cutoff_dt
-        except:
-            return False
+    def _stale_flags(self, commit_dates: List[str]) -> List[bool]:
+        """各ブランチが古いかをまとめて判定
+
+        ISO 8601 の日付部分（YYYY-MM-DD）は文字列比較で大小が決まるため、
+        日付オブジェクトに変換せずに基準日と比較する。
+        """
+        cutoff = self._stale_cutoff.isoformat()
+        return [len(d) >= 10 and d[:10] < cutoff for d in commit_dates]
     
     def analyze_branches(self) -> Dict[BranchCategory, List[BranchInfo]]:
         """ブランチを分析して分類"""
@@ -145,154 +143,157 @@ class GitBranchCleanup:
             BranchCategory.MERGED: [],
             BranchCategory.GONE_REMOTE: [],
             BranchCategory.AHEAD: [],
-            BranchCategory.STALE: [],
             BranchCategory.UNMERGED: []
         }
         
-        # すべてのローカルブランチを取得
-        all_branches_output, _ = self._run_git_command([
-            'for-each-ref', '--sort=-committerdate', 'refs/heads/',
-            '--format=%(refname:short)'
-        ])
-        all_branches = [b.strip() for b in all_branches_output.split('\n') if b.strip()]
+        # 独立した読み取り専用のGitコマンドを並列実行
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            # すべてのローカルブランチと詳細情報を一括取得
+            all_branches_future = executor.submit(self._run_git_command, [
+                'for-each-ref', '--sort=-committerdate', 'refs/heads/',
+                '--format=' + '%00'.join(self.BRANCH_INFO_FIELDS)
+            ])
+            # マージ済みブランチ
+            merged_future = executor.submit(self._run_git_command, [
+                'branch', '--merged', self.base_branch
+            ])
+            # 未マージブランチ
+            unmerged_future = executor.submit(self._run_git_command, [
+                'branch', '--no-merged', self.base_branch
+            ])
+            all_branches_output, _ = all_branches_future.result()
+            merged_output, _ = merged_future.result()
+            unmerged_output, _ = unmerged_future.result()
+        
+        all_branches = []
+        for line in all_branches_output.split('\n'):
+            if not line.strip():
+                continue
+            fields = line.split('\x00')
+            fields += [''] * (len(self.BRANCH_INFO_FIELDS) - len(fields))
+            all_branches.append(fields)
         
-        # マージ済みブランチ
-        merged_output, _ = self._run_git_command([
-            'branch', '--merged', self.base_branch
-        ])
         merged_branches = set(
             b.strip().lstrip('* ').strip()
             for b in merged_output.split('\n')
             if b.strip()
         )
         
-        # 未マージブランチ
-        unmerged_output, _ = self._run_git_command([
-            'branch', '--no-merged', self.base_branch
-        ])
         unmerged_branches = set(
             b.strip().lstrip('* ').strip()
             for b in unmerged_output.split('\n')
             if b.strip()
         )
         
-        # リモート削除済みブランチ
-        gone_output, _ = self._run_git_command([
-            'branch', '-vv'
-        ])
-        gone_branches = set()
-        for line in gone_output.split('\n'):
-            if ': gone]' in line:
-                match = re.match(r'^\s*\*?\s*(\S+)', line)
-                if match:
-                    gone_branches.add(match.group(1))
+        # 保護ブランチ・現在のブランチ・空名は分類対象外
+        protected = self.PROTECTED_BRANCHES | {self.current_branch, ''}
+        
+        stale_flags = self._stale_flags([fields[1] for fields in all_branches])
         
         # 各ブランチを分類
-        for branch in all_branches:
-            if self._is_protected_branch(branch):
+        for fields, stale in zip(all_branches, stale_flags):
+            branch, commit_date, relative_date, subject, upstream, trackshort, track = fields
+            if branch in protected:
                 continue
             
-            info_dict = self._get_branch_info(branch)
+            is_ahead = bool(trackshort) and '>' in trackshort
+            # 上流ブランチが削除されている場合 track は "[gone]" になる
+            is_gone = track == '[gone]'
+            
+            # カテゴリ判定（マージ状態 > リモート削除済み > 既定値の順）
+            if is_ahead:
+                category = BranchCategory.AHEAD
+            elif branch in merged_branches:
+                category = BranchCategory.MERGED
+            elif branch in unmerged_branches:
+                category = BranchCategory.UNMERGED
+            elif is_gone:
+                category = BranchCategory.GONE_REMOTE
+            else:
+                category = BranchCategory.MERGED  # デフォルト
+            
             branch_info = BranchInfo(
                 name=branch,
-                category=BranchCategory.MERGED,  # デフォルト
-                commit_date=info_dict.get('commit_date', ''),
-                relative_date=info_dict.get('relative_date', '不明'),
-                subject=info_dict.get('subject', ''),
-                upstream=info_dict.get('upstream'),
-                trackshort=info_dict.get('trackshort'),
-                is_protected=self._is_protected_branch(branch)
+                category=category,
+                commit_date=commit_date,
+                relative_date=relative_date or '不明',
+                subject=subject,
+                upstream=upstream or None,
+                trackshort=trackshort or None,
+                is_protected=False,
+                # 古いブランチかチェック（カテゴリとは別にフラグで保持）
+                is_stale=stale and not is_ahead
             )
             
-            # 上流より先行しているかチェック
-            if branch_info.trackshort and '>' in branch_info.trackshort:
-                branch_info.category = BranchCategory.AHEAD
+            # 上流より先行しているブランチは他の一覧に含めない
+            if is_ahead:
                 categories[BranchCategory.AHEAD].append(branch_info)
                 continue
             
-            # リモート削除済みかチェック
-            if branch in gone_branches:
-                branch_info.category = BranchCategory.GONE_REMOTE
+            # リモート削除済み
+            if is_gone:
                 categories[BranchCategory.GONE_REMOTE].append(branch_info)
             
-            # マージ済みかチェック
+            # マージ済み / 未マージ
             if branch in merged_branches:
-                branch_info.category = BranchCategory.MERGED
                 categories[BranchCategory.MERGED].append(branch_info)
             elif branch in unmerged_branches:
-                branch_info.category = BranchCategory.UNMERGED
                 categories[BranchCategory.UNMERGED].append(branch_info)
-            
-            # 古いブランチかチェック
-            if self._is_stale(branch_info.commit_date):
-                if branch_info.category not in [BranchCategory.AHEAD]:
-                    # 既に他のカテゴリに追加されていない場合のみ
-                    if branch_info not in categories[branch_info.category]:
-                        categories[BranchCategory.STALE].append(branch_info)
         
         return categories
     
+    def _write_section(self, title: str, lines: List[str]):
+        """見出しと行をまとめて1回で出力"""
+        body = '\n'.join(lines) if lines else "  （該当なし）"
+        sys.stdout.write(f"{title}\n{body}\n\n")
+    
     def display_results(self, categories: Dict[BranchCategory, List[BranchInfo]]):
         """結果を表示"""
-        print(f"\nベースブランチ: {self.base_branch}")
-        print(f"現在のブランチ: {self.current_branch}\n")
+        sys.stdout.write(
+            f"\nベースブランチ: {self.base_branch}\n"
+            f"現在のブランチ: {self.current_branch}\n\n"
+        )
         
         # マージ済み
-        print("### 削除可能（マージ済み）")
-        if categories[BranchCategory.MERGED]:
-            for branch in categories[BranchCategory.MERGED]:
-                print(f"  - {branch.name} ({branch.relative_date}) - {branch.subject}")
-        else:
-            print("  （該当なし）")
-        print()
+        self._write_section("### 削除可能（マージ済み）", [
+            f"  - {branch.name} ({branch.relative_date}) - {branch.subject}"
+            for branch in categories[BranchCategory.MERGED]
+        ])
         
         # リモート削除済み
-        print("### リモート削除済み")
-        if categories[BranchCategory.GONE_REMOTE]:
-            for branch in categories[BranchCategory.GONE_REMOTE]:
-                print(f"  - {branch.name} ({branch.relative_date}) - {branch.subject}")
-        else:
-            print("  （該当なし）")
-        print()
+        self._write_section("### リモート削除済み", [
+            f"  - {branch.name} ({branch.relative_date}) - {branch.subject}"
+            for branch in categories[BranchCategory.GONE_REMOTE]
+        ])
         
         # 上流より先行
-        print("### ⚠️ 上流より先行（削除しないでください）")
-        if categories[BranchCategory.AHEAD]:
-            for branch in categories[BranchCategory.AHEAD]:
-                unpushed = self._count_unpushed_commits(branch.name)
-                print(f"  - {branch.name} ({branch.relative_date}) - プッシュされていないコミットが{unpushed}つあります")
-        else:
-            print("  （該当なし）")
-        print()
+        self._write_section("### ⚠️ 上流より先行（削除しないでください）", [
+            f"  - {branch.name} ({branch.relative_date}) - "
+            f"プッシュされていないコミットが{self._count_unpushed_commits(branch.name)}つあります"
+            for branch in categories[BranchCategory.AHEAD]
+        ])
         
         # 古いブランチ
-        print(f"### 古いブランチ（{self.stale_days}日以上）")
-        if categories[BranchCategory.STALE]:
-            for branch in categories[BranchCategory.STALE]:
-                is_merged = "マージ済み" if branch.category == BranchCategory.MERGED else "未マージ"
-                print(f"  - {branch.name} ({branch.relative_date}) - {is_merged} - {branch.subject}")
-        else:
-            print("  （該当なし）")
-        print()
+        self._write_section(f"### 古いブランチ（{self.stale_days}日以上）", [
+            f"  - {branch.name} ({branch.relative_date}) - "
+            f"{'マージ済み' if branch.category == BranchCategory.MERGED else '未マージ'} - {branch.subject}"
+            for category in (BranchCategory.MERGED, BranchCategory.UNMERGED)
+            for branch in categories[category]
+            if branch.is_stale
+        ])
         
         # アクティブ（未マージ）
-        print("### アクティブ（未マージ）")
-        if categories[BranchCategory.UNMERGED]:
-            for branch in categories[BranchCategory.UNMERGED]:
-                if branch.category != BranchCategory.AHEAD:
-                    print(f"  - {branch.name} ({branch.relative_date}) - {branch.subject}")
-        else:
-            print("  （該当なし）")
-        print()
+        self._write_section("### アクティブ（未マージ）", [
+            f"  - {branch.name} ({branch.relative_date}) - {branch.subject}"
+            for branch in categories[BranchCategory.UNMERGED]
+        ])
     
     def _count_unpushed_commits(self, branch: str) -> int:
         """プッシュされていないコミット数をカウント"""
-        output, _ = self._run_git_command([
-            'log', '--oneline', f'@{u}..HEAD'
+        output, code = self._run_git_command([
+            'rev-list', '--count', f'{branch}@{{upstream}}..{branch}'
         ])
-        if not output:
-            return 0
-        return len([l for l in output.split('\n') if l.strip()])
+        return int(output) if code == 0 and output.isdigit() else 0
     
     def delete_branches(self, branches: List[str], force: bool = False):
         """ブランチを削除"""
@@ -329,6 +330,22 @@ class GitBranchCleanup:
         print(f"\n削除完了: {deleted}個")
         if failed > 0:
             print(f"削除失敗: {failed}個")
+        
+        if deleted > 0:
+            self._run_maintenance()
+    
+    def _run_maintenance(self):
+        """ブランチ削除後にリポジトリのメンテナンスを実行"""
+        if self.aggressive_gc:
+            print("リポジトリを最適化中（gc --aggressive）...")
+            _, code = self._run_git_command(['gc', '--prune=now', '--aggressive'])
+        else:
+            _, code = self._run_git_command(['maintenance', 'run', '--task=gc', '--auto'])
+            if code != 0:
+                # git maintenance が使えない古いGit向け
+                _, code = self._run_git_command(['gc', '--auto'])
+        if code != 0:
+            print("警告: リポジトリのメンテナンスに失敗しました。", file=sys.stderr)
     
     def run(self):
         """メイン処理を実行"""
@@ -396,11 +413,18 @@ def main():
         help='古いブランチとみなす日数（デフォルト: 30）'
     )
     
+    parser.add_argument(
+        '--aggressive-gc',
+        action='store_true',
+        help='削除後に git gc --prune=now --aggressive を実行'
+    )
+    
     args = parser.parse_args()
     
     cleanup = GitBranchCleanup(
         stale_days=args.stale_days,
-        dry_run=args.dry_run
+        dry_run=args.dry_run,
+        aggressive_gc=args.aggressive_gc
     )
     cleanup.run()
 